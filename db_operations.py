@@ -1,29 +1,61 @@
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
 from os import getenv
-from typing import AsyncGenerator, Literal, Optional
+from typing import Any, AsyncGenerator, Literal, Optional
 
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
 from pydantic import BaseModel, Field
+from pymongo import AsyncMongoClient, UpdateOne
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import DuplicateKeyError
+
+mongo_clients: dict[int, AsyncMongoClient[dict[str, Any]]] = {}
+
+
+def get_mongo_client() -> AsyncMongoClient[dict[str, Any]]:
+    """Returns the MongoDB AsyncMongoClient shared by the running event loop, creating it on first use
+
+    :returns: AsyncMongoClient object
+    :rtype: AsyncMongoClient
+
+    """
+    loop_id = id(asyncio.get_running_loop())
+    cluster = mongo_clients.get(loop_id)
+    if cluster is None:
+        cluster = AsyncMongoClient[dict[str, Any]](
+            getenv("MONGO_PASS", "MONGO_PASS"),
+            maxPoolSize=int(getenv("MONGO_MAX_POOL", "50")),
+            minPoolSize=int(getenv("MONGO_MIN_POOL", "10")),
+            serverSelectionTimeoutMS=5000,
+        )
+        mongo_clients[loop_id] = cluster
+    return cluster
 
 
 @asynccontextmanager
-async def get_karma_db() -> AsyncGenerator[AsyncIOMotorDatabase, None]:
-    """Returns the MongoDB AsyncIOMotorClient
+async def get_karma_db() -> AsyncGenerator[AsyncDatabase[dict[str, Any]], None]:
+    """Returns the karma database from the shared MongoDB AsyncMongoClient
 
-    :returns: AsyncIOMotorClient object
-    :rtype: AsyncIOMotorClient
+    The client is closed on exit only by the context that created it.
+
+    :returns: AsyncDatabase object
+    :rtype: AsyncDatabase
 
     """
-    cluster = AsyncIOMotorClient(getenv("MONGO_PASS", "MONGO_PASS"))
+    loop_id = id(asyncio.get_running_loop())
+    owns_cluster = loop_id not in mongo_clients
+    cluster = get_mongo_client()
     try:
         yield cluster["fallout76marketplace_karma_db"]
     finally:
-        cluster.close()
+        if owns_cluster:
+            del mongo_clients[loop_id]
+            await cluster.close()
 
 
-async def get_mongo_collection(collection_name: str, fallout76marketplace_karma_db: AsyncIOMotorDatabase) -> AsyncIOMotorCollection:
+async def get_mongo_collection(collection_name: str, fallout76marketplace_karma_db: AsyncDatabase[dict[str, Any]]) -> AsyncCollection[dict[str, Any]]:
     """Returns the user databased from dataBased Cluster from MongoDB
 
     :returns: Returns a Collection from Mongo DB
@@ -45,7 +77,24 @@ class UserProfile(BaseModel):
     m76_karma: int
 
 
-async def find_profile(reddit_username: str, users_collection: AsyncIOMotorCollection) -> Optional[UserProfile]:
+USER_PROFILE_PROJECTION = {"_id": 0, "reddit_username": 1, "karma": 1, "m76_karma": 1, "gamertags": 1}
+
+
+def profile_from_document(profile: dict[str, Any]) -> UserProfile:
+    """Builds a UserProfile from a stored document without re-validating it.
+
+    Documents are validated before they are written, so the models are constructed directly.
+
+    :param profile: The user profile document returned by MongoDB
+
+    :returns: UserProfile object
+
+    """
+    profile["gamertags"] = [Gamertag.model_construct(**gamertag) for gamertag in profile["gamertags"]]
+    return UserProfile.model_construct(**profile)
+
+
+async def find_profile(reddit_username: str, users_collection: AsyncCollection[dict[str, Any]]) -> Optional[UserProfile]:
     """Finds the user in the users_collection, or creates one if it doesn't exist using default values.
 
     :param reddit_username: The user whose profile to find or create
@@ -54,34 +103,68 @@ async def find_profile(reddit_username: str, users_collection: AsyncIOMotorColle
     :returns: Dict object with user profile info
 
     """
-    profile = await users_collection.find_one({"reddit_username": reddit_username})
+    profile = await users_collection.find_one({"reddit_username": reddit_username}, projection=USER_PROFILE_PROJECTION)
     if profile is None:
         return None
 
-    return UserProfile(**profile)
+    return profile_from_document(profile)
 
 
-async def update_user_profile(user_profile: UserProfile, users_collection: AsyncIOMotorCollection) -> bool:
-    profile = await users_collection.find_one({"reddit_username": user_profile.reddit_username})
-    if profile is not None:
-        await users_collection.replace_one({"reddit_username": user_profile.reddit_username}, user_profile.model_dump())
-        return True
-    return False
+async def find_profiles(reddit_usernames: list[str], users_collection: AsyncCollection[dict[str, Any]]) -> list[UserProfile]:
+    """Finds all the users in the users_collection with a single query.
 
+    :param reddit_usernames: The users whose profiles to find
+    :param users_collection: The collection in which the profiles will be searched
 
-async def add_user_profile(user_profile: UserProfile, users_collection: AsyncIOMotorCollection) -> bool:
-    profile = await users_collection.find_one({"reddit_username": user_profile.reddit_username})
+    :returns: List of the user profiles that were found
 
-    if profile is not None:
-        return False
+    """
+    unique_usernames = list(dict.fromkeys(reddit_usernames))
+    cursor = users_collection.find({"reddit_username": {"$in": unique_usernames}}, projection=USER_PROFILE_PROJECTION)
+    return [profile_from_document(profile) async for profile in cursor.batch_size(len(unique_usernames))]
+
+
+async def update_user_profile(user_profile: UserProfile, users_collection: AsyncCollection[dict[str, Any]]) -> bool:
+    result = await users_collection.update_one(
+        {"reddit_username": user_profile.reddit_username}, {"$set": user_profile.model_dump(exclude={"reddit_username"})}
+    )
+    return result.matched_count == 1
+
+
+async def update_user_profiles(user_profiles: list[UserProfile], users_collection: AsyncCollection[dict[str, Any]]) -> int:
+    """Updates all the existing user profiles in a single unordered bulk write.
+
+    When a Reddit username appears more than once, the last profile for it is used.
 
-    insert_result = await users_collection.insert_one(
-        {
-            "reddit_username": user_profile.reddit_username,
-            "karma": user_profile.karma,
-            "m76_karma": user_profile.m76_karma,
-            "gamertags": user_profile.gamertags,
-        }
+    :param user_profiles: The profiles to update
+    :param users_collection: The collection in which the profiles will be updated
+
+    :returns: Number of profiles that matched an existing Reddit username
+
+    """
+    if not user_profiles:
+        return 0
+
+    unique_profiles = {user_profile.reddit_username: user_profile for user_profile in user_profiles}
+    result = await users_collection.bulk_write(
+        [
+            UpdateOne({"reddit_username": user_profile.reddit_username}, {"$set": user_profile.model_dump(exclude={"reddit_username"})})
+            for user_profile in unique_profiles.values()
+        ],
+        ordered=False,
     )
+    return result.matched_count
+
+
+async def add_user_profile(user_profile: UserProfile, users_collection: AsyncCollection[dict[str, Any]], has_unique_index: bool = True) -> bool:
+    if not has_unique_index:
+        profile = await users_collection.find_one({"reddit_username": user_profile.reddit_username}, projection={"_id": 1})
+        if profile is not None:
+            return False
+
+    try:
+        insert_result = await users_collection.insert_one(user_profile.model_dump())
+    except DuplicateKeyError:
+        return False
 
     return insert_result.acknowledged
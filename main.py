@@ -1,27 +1,58 @@
 from __future__ import annotations
 
+import logging
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, cast
+from typing import Any, AsyncGenerator, cast
 
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, Request
-from fastapi.responses import JSONResponse, RedirectResponse
-from motor.motor_asyncio import AsyncIOMotorDatabase
-from pydantic import BaseModel
-
-from db_operations import UserProfile, add_user_profile, find_profile, get_karma_db, get_mongo_collection, update_user_profile
+from fastapi import Body, FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse, Response
+from pydantic import BaseModel, TypeAdapter
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import OperationFailure
+
+from db_operations import (
+    UserProfile,
+    add_user_profile,
+    find_profile,
+    find_profiles,
+    get_karma_db,
+    get_mongo_collection,
+    update_user_profile,
+    update_user_profiles,
+)
 
 load_dotenv()
 
+logger = logging.getLogger("uvicorn.error")
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    startup_start = time.perf_counter()
     async with get_karma_db() as karma_db:
         app.state.karma_db = karma_db
+        await karma_db.command("ping")
+        user_karma_collection = await get_mongo_collection("user_karma", karma_db)
+        app.state.user_karma_collection = user_karma_collection
+        try:
+            await user_karma_collection.create_index("reddit_username", unique=True, name="reddit_username_uniq")
+            app.state.has_unique_username_index = True
+        except OperationFailure as error:
+            app.state.has_unique_username_index = False
+            logger.error(
+                "Could not create the unique reddit_username index, new profiles are checked with an extra lookup until it exists. "
+                "Remove duplicate reddit_username profiles and any conflicting reddit_username index, then restart: %s",
+                error,
+            )
+        logger.info("MongoDB ping and index setup finished in %.1f ms", (time.perf_counter() - startup_start) * 1000)
         yield
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=512)
 
 
 @app.get("/")
@@ -29,26 +60,45 @@ async def redirect_to_docs() -> RedirectResponse:
     return RedirectResponse("/docs")
 
 
-async def get_db(request: Request) -> AsyncIOMotorDatabase:
-    return cast(AsyncIOMotorDatabase, request.app.state.karma_db)
+def get_users_collection(request: Request) -> AsyncCollection[dict[str, Any]]:
+    return cast(AsyncCollection[dict[str, Any]], request.app.state.user_karma_collection)
+
+
+def has_unique_username_index(request: Request) -> bool:
+    return cast(bool, request.app.state.has_unique_username_index)
 
 
 class Message(BaseModel):
     message: str
 
 
+MAX_BULK_USERNAMES = 100
+USER_PROFILES_ADAPTER = TypeAdapter(list[UserProfile])
+
+
 @app.get(
     path="/users/{reddit_username}",
     response_model=UserProfile,
     summary="Get KarmaProfile by Reddit username.",
     responses={404: {"model": Message}},
 )
-async def get_user(reddit_username: str, karma_db: AsyncIOMotorDatabase = Depends(get_db)) -> UserProfile | JSONResponse:
-    user_karma_collection = await get_mongo_collection("user_karma", karma_db)
+async def get_user(reddit_username: str, request: Request) -> Response:
+    user_karma_collection = get_users_collection(request)
     user_profile = await find_profile(reddit_username, user_karma_collection)
     if user_profile is None:
-        return JSONResponse(status_code=404, content={"message": f"Reddit username '{reddit_username}' not found"})
-    return user_profile
+        return ORJSONResponse(status_code=404, content={"message": f"Reddit username '{reddit_username}' not found"})
+    return Response(content=user_profile.model_dump_json(), media_type="application/json")
+
+
+@app.post(
+    path="/users/bulk",
+    response_model=list[UserProfile],
+    summary="Get KarmaProfiles for multiple Reddit usernames.",
+)
+async def get_users(request: Request, reddit_usernames: list[str] = Body(..., max_length=MAX_BULK_USERNAMES)) -> Response:
+    user_karma_collection = get_users_collection(request)
+    user_profiles = await find_profiles(reddit_usernames, user_karma_collection)
+    return Response(content=USER_PROFILES_ADAPTER.dump_json(user_profiles), media_type="application/json")
 
 
 @app.put(
@@ -59,13 +109,25 @@ async def get_user(reddit_username: str, karma_db: AsyncIOMotorDatabase = Depend
         404: {"model": Message},
     },
 )
-async def update_gamertag(user_profile: UserProfile, karma_db: AsyncIOMotorDatabase = Depends(get_db)) -> JSONResponse:
-    user_karma_collection = await get_mongo_collection("user_karma", karma_db)
+async def update_gamertag(user_profile: UserProfile, request: Request) -> ORJSONResponse:
+    user_karma_collection = get_users_collection(request)
     status = await update_user_profile(user_profile=user_profile, users_collection=user_karma_collection)
     if status:
-        return JSONResponse(status_code=200, content={"message": f"Karma Profile updated successfully for Reddit username: {user_profile.reddit_username}."})
+        return ORJSONResponse(status_code=200, content={"message": f"Karma Profile updated successfully for Reddit username: {user_profile.reddit_username}."})
     else:
-        return JSONResponse(status_code=404, content={"message": f"Reddit username '{user_profile.reddit_username}' not found."})
+        return ORJSONResponse(status_code=404, content={"message": f"Reddit username '{user_profile.reddit_username}' not found."})
+
+
+@app.put(
+    path="/users/bulk",
+    summary="Update existing KarmaProfiles for multiple Reddit usernames.",
+    responses={200: {"model": Message}},
+)
+async def update_gamertags(request: Request, user_profiles: list[UserProfile] = Body(..., max_length=MAX_BULK_USERNAMES)) -> ORJSONResponse:
+    user_karma_collection = get_users_collection(request)
+    updated_count = await update_user_profiles(user_profiles=user_profiles, users_collection=user_karma_collection)
+    profile_count = len({user_profile.reddit_username for user_profile in user_profiles})
+    return ORJSONResponse(status_code=200, content={"message": f"{updated_count} of {profile_count} Karma Profiles updated successfully."})
 
 
 @app.post(
@@ -76,10 +138,10 @@ async def update_gamertag(user_profile: UserProfile, karma_db: AsyncIOMotorDatab
         400: {"model": Message},
     },
 )
-async def add_profile(user_profile: UserProfile, karma_db: AsyncIOMotorDatabase = Depends(get_db)) -> JSONResponse:
-    user_karma_collection = await get_mongo_collection("user_karma", karma_db)
-    status = await add_user_profile(user_profile=user_profile, users_collection=user_karma_collection)
+async def add_profile(user_profile: UserProfile, request: Request) -> ORJSONResponse:
+    user_karma_collection = get_users_collection(request)
+    status = await add_user_profile(user_profile=user_profile, users_collection=user_karma_collection, has_unique_index=has_unique_username_index(request))
     if status:
-        return JSONResponse(status_code=200, content={"message": f"Karma Profile added successfully for Reddit username: {user_profile.reddit_username}."})
+        return ORJSONResponse(status_code=200, content={"message": f"Karma Profile added successfully for Reddit username: {user_profile.reddit_username}."})
     else:
-        return JSONResponse(status_code=400, content={"message": "Profile already exists or invalid fields in user profile."})
+        return ORJSONResponse(status_code=400, content={"message": "Profile already exists or invalid fields in user profile."})